@@ -8,6 +8,8 @@ Place this script in the same directory as:
 - Your backup .tar file(s)
 
 Requirements:
+pip install pycryptodome (recommended, uses AES-NI)
+or
 pip install cryptography
 
 Usage:
@@ -17,85 +19,254 @@ Usage:
 """
 
 import sys
+import io
+import queue
 import tarfile
-import glob
+import threading
+import uuid
+import zlib
 import os
 import shutil
 import re
+import string
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
 from pathlib import Path
-from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.ciphers import (
-    Cipher,
-    algorithms,
-    modes,
-)
 import hashlib
 
+try:
+    from Crypto.Cipher import AES
+except ImportError:
+    AES = None
+try:
+    from cryptography.hazmat.backends import default_backend
+    from cryptography.hazmat.primitives.ciphers import (
+        Cipher,
+        algorithms,
+        modes,
+    )
+except ImportError:
+    Cipher = None
+
+def _pycryptodome_has_aes_ni():
+    """Return True unless PyCryptodome reports the CPU lacks AES-NI."""
+    # Private module with a native helper; any failure means "can't tell"
+    try:
+        from Crypto.Util._cpu_features import have_aes_ni
+        return bool(have_aes_ni())
+    except Exception:
+        return True
+
+# PyCryptodome only accelerates AES with AES-NI; elsewhere (e.g. ARM) the
+# OpenSSL code behind cryptography is the faster choice when installed.
+USE_PYCRYPTODOME = AES is not None and (Cipher is None or _pycryptodome_has_aes_ni())
+
+# Emergency kit key: XXXX-XXXX-XXXX-XXXX-XXXX-XXXX-XXXX
+_KEY_RE = re.compile(rb'\b(?:[A-Z0-9]{4}-){6}[A-Z0-9]{4}\b')
+_KEY_CHARS = frozenset(string.ascii_uppercase + string.digits)
+
 def check_requirements():
     """Check if required packages are installed."""
-    try:
-        import cryptography
-    except ImportError:
-        print("Error: Required package 'cryptography' is not installed.")
-        print("Please install it using: pip install cryptography")
+    if AES is None and Cipher is None:
+        print("Error: Neither 'pycryptodome' nor 'cryptography' is installed.")
+        print("Please install one using: pip install pycryptodome")
         sys.exit(1)
 
+def is_kit_file(name):
+    """Match names like the glob '*emergency*kit*.txt'."""
+    start = name.find('emergency')
+    return (
+        start >= 0
+        and name.endswith('.txt')
+        and 'kit' in name[start + len('emergency'):-len('.txt')]
+    )
+
 def extract_key_from_kit(kit_path):
     """Extract encryption key from emergency kit file."""
     try:
-        with open(kit_path, 'r') as f:
+        with open(kit_path, 'rb') as f:
             content = f.read()
-            # Look for the key pattern: XXXX-XXXX-XXXX-XXXX-XXXX-XXXX-XXXX
-            match = re.search(r'\b([A-Z0-9]{4}-){6}[A-Z0-9]{4}\b', content)
+            match = _KEY_RE.search(content)
             if match:
-                return match.group(0)
+                return match.group(0).decode('ascii')
     except Exception as e:
         print(f"Error reading emergency kit file: {e}")
     return None
 
+def is_valid_key(key):
+    """Check that key has the emergency kit format without a regex."""
+    groups = key.split('-')
+    return (
+        len(groups) == 7
+        and all(len(group) == 4 for group in groups)
+        and _KEY_CHARS.issuperset(''.join(groups))
+    )
+
+# Empty SHA-256 context; copying it is cheaper than constructing a new hasher.
+_SHA256 = hashlib.sha256()
+
+def sha256_iterate(data, rounds=100):
+    """Hash data with SHA-256 repeatedly, feeding each digest back in."""
+    for _ in range(rounds):
+        h = _SHA256.copy()
+        h.update(data)
+        data = h.digest()
+    return data
+
+@lru_cache(maxsize=4)
 def password_to_key(password):
     """Convert password/key to encryption key."""
-    password = password.encode()
-    for _ in range(100):
-        password = hashlib.sha256(password).digest()
-    return password[:16]
+    return sha256_iterate(password.encode())[:16]
 
 def generate_iv(key, salt):
     """Generate initialization vector."""
-    temp_iv = key + salt
-    for _ in range(100):
-        temp_iv = hashlib.sha256(temp_iv).digest()
-    return temp_iv[:16]
+    return sha256_iterate(key + salt)[:16]
+
+def _pycryptodome_decryptor(key, iv):
+    """Return a decrypt_into(src, dst) function using PyCryptodome."""
+    aes = AES.new(key, AES.MODE_CBC, iv)
+
+    def decrypt_into(src, dst):
+        aes.decrypt(src, output=dst[:len(src)])
+
+    return decrypt_into
+
+def _cryptography_decryptor(key, iv):
+    """Return a decrypt_into(src, dst) function using cryptography."""
+    cipher = Cipher(algorithms.AES(key), modes.CBC(iv), backend=default_backend())
+    return cipher.decryptor().update_into
+
+def fadvise(fileobj, advice):
+    """Give the kernel a posix_fadvise() hint for a whole file, if supported."""
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(fileobj.fileno(), 0, 0, getattr(os, advice))
+        except OSError:
+            pass  # Only a hint; never fail a restore over it
 
 class SecureTarFile:
-    """Handle encrypted tar files."""
-    def __init__(self, filename, password):
+    """Handle encrypted tar files.
+
+    Decryption runs on a background thread that feeds decrypted chunks
+    through a bounded queue, so AES and gzip inflation overlap. read()
+    inflates the gzip layer itself, so tarfile only parses a plain stream.
+    Chunk buffers are preallocated, recycled once inflated, and handed on
+    to the next SecureTarFile when this one is closed.
+    """
+    BLOCK_SIZE = 16
+    CHUNK_SIZE = 1 << 20  # Must stay a multiple of BLOCK_SIZE.
+    QUEUE_DEPTH = 4
+
+    # Chunk buffers released by closed instances
+    _spare_buffers = []
+
+    # Backend chosen once at import time
+    _new_decryptor = staticmethod(
+        _pycryptodome_decryptor if USE_PYCRYPTODOME else _cryptography_decryptor
+    )
+
+    def __init__(self, filename, password, fileobj=None):
         self._file = None
+        self._fileobj = fileobj
         self._name = Path(filename)
         self._tar = None
-        self._tar_mode = "r|gz"
-        self._aes = None
+        self._tar_mode = "r|"
         self._key = password_to_key(password)
-        self._decrypt = None
+        self._decrypt_into = None
+        self._queue = None
+        self._free = None
+        self._buffers = []
+        self._reader = None
+        self._stop = None
+        self._inflate = None
+        self._buffer = bytearray()
+        self._eof = False
 
     def __enter__(self):
-        self._file = self._name.open("rb")
+        if self._fileobj is not None:
+            self._file = self._fileobj
+        else:
+            self._file = self._name.open("rb")
+            fadvise(self._file, "POSIX_FADV_SEQUENTIAL")
         cbc_rand = self.read_rand_from_header(self._file)
-        self._aes = Cipher(
-            algorithms.AES(self._key),
-            modes.CBC(generate_iv(self._key, cbc_rand)),
-            backend=default_backend(),
+        self._decrypt_into = self._new_decryptor(
+            self._key, generate_iv(self._key, cbc_rand)
         )
-        self._decrypt = self._aes.decryptor()
-        self._tar = tarfile.open(fileobj=self, mode=self._tar_mode)
+        self._queue = queue.Queue(maxsize=self.QUEUE_DEPTH)
+        # One input buffer plus enough output buffers to fill the queue
+        self._buffers = [self._take_buffer() for _ in range(self.QUEUE_DEPTH + 2)]
+        self._free = queue.Queue()
+        for outbuf in self._buffers[1:]:
+            self._free.put(outbuf)
+        self._inflate = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        self._stop = threading.Event()
+        self._reader = threading.Thread(target=self._produce, daemon=True)
+        self._reader.start()
+        try:
+            # Let tarfile pull whole chunks rather than 10 KiB records.
+            self._tar = tarfile.open(
+                fileobj=self, mode=self._tar_mode, bufsize=self.CHUNK_SIZE
+            )
+        except BaseException:
+            self.__exit__(None, None, None)
+            raise
         return self._tar
 
     def __exit__(self, exc_type, exc_value, traceback):
         if self._tar:
             self._tar.close()
-        if self._file:
+        if self._reader:
+            self._stop.set()
+            self._reader.join()
+        SecureTarFile._spare_buffers.extend(self._buffers)
+        self._buffers = []
+        if self._file and self._fileobj is None:
+            fadvise(self._file, "POSIX_FADV_DONTNEED")
             self._file.close()
 
+    @classmethod
+    def _take_buffer(cls):
+        """Return a spare chunk buffer, allocating one if none are left."""
+        try:
+            return cls._spare_buffers.pop()
+        except IndexError:
+            # update_into() wants one block of slack past the input length.
+            return bytearray(cls.CHUNK_SIZE + cls.BLOCK_SIZE - 1)
+
+    def _produce(self):
+        """Read and decrypt the file into the queue until EOF.
+
+        Every chunk is block aligned, so CBC decryption maps input bytes
+        one-to-one onto output bytes and never has a tail to carry over.
+        """
+        inbuf = memoryview(self._buffers[0])[:self.CHUNK_SIZE]
+        try:
+            while not self._stop.is_set():
+                try:
+                    outbuf = self._free.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                size = self._file.readinto(inbuf)
+                if not size:
+                    break
+                if size % self.BLOCK_SIZE:
+                    raise tarfile.ReadError("encrypted data is not block aligned")
+                self._decrypt_into(inbuf[:size], memoryview(outbuf))
+                self._put((outbuf, size))
+        except Exception as e:
+            self._put(e)
+            return
+        self._put(None)
+
+    def _put(self, item):
+        """Queue an item, giving up once the consumer has stopped."""
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
     def read_rand_from_header(cls, st_file):
         """Return header bytes."""
         SECURETAR_MAGIC = b"SecureTar\x02\x00\x00\x00\x00\x00\x00"
@@ -111,36 +282,168 @@ class SecureTarFile:
         return cbc_rand
 
 
+    def _inflate_chunk(self, data):
+        """Append up to one chunk of inflated data to the read buffer."""
+        try:
+            self._buffer += self._inflate.decompress(data, self.CHUNK_SIZE)
+        except zlib.error as e:
+            raise tarfile.ReadError(f"invalid compressed data: {e}") from e
+
     def read(self, size=0):
-        return self._decrypt.update(self._file.read(size))
+        while len(self._buffer) < size and not self._inflate.eof:
+            if self._inflate.unconsumed_tail:
+                self._inflate_chunk(self._inflate.unconsumed_tail)
+                continue
+            if self._eof:
+                break
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                outbuf, n = item
+                with memoryview(outbuf) as view:
+                    self._inflate_chunk(view[:n])
+                self._free.put(outbuf)
+        with memoryview(self._buffer) as view:
+            data = bytes(view[:size])
+        del self._buffer[:size]
+        return data
+
+# Threads deleting stale extraction directories
+_cleanup_threads = []
+
+def remove_tree_in_background(path):
+    """Move a directory aside and delete it on a background thread.
+
+    Directories left aside by an interrupted earlier run are deleted too.
+    """
+    parent = os.path.dirname(path) or '.'
+    prefix = f'{os.path.basename(path)}.old.'
+    with os.scandir(parent) as it:
+        stale = [
+            os.path.join(parent, e.name) for e in it
+            if e.name.startswith(prefix) and e.is_dir(follow_symlinks=False)
+        ]
+    if os.path.isdir(path):
+        moved = f'{path}.old.{uuid.uuid4().hex}'
+        os.rename(path, moved)
+        stale.append(moved)
+    if not stale:
+        return
+    thread = threading.Thread(target=_remove_trees, args=(stale,), daemon=True)
+    thread.start()
+    _cleanup_threads.append(thread)
+
+def _remove_trees(paths):
+    for path in paths:
+        shutil.rmtree(path, True)
+
+def wait_for_cleanup():
+    """Wait for background directory deletions to finish."""
+    while _cleanup_threads:
+        _cleanup_threads.pop().join()
+
+class _SendfileTarFile(tarfile.TarFile):
+    """TarFile that copies regular members in-kernel with os.sendfile()."""
+
+    def makefile(self, tarinfo, targetpath):
+        # sendfile() copies raw bytes, so it only applies to members stored
+        # as-is in a plain (uncompressed) file
+        if (
+            tarinfo.sparse is not None
+            or not sys.platform.startswith("linux")
+            or not isinstance(self.fileobj, io.BufferedReader)
+            or not isinstance(self.fileobj.raw, io.FileIO)
+        ):
+            return super().makefile(tarinfo, targetpath)
+        offset = tarinfo.offset_data
+        remaining = tarinfo.size
+        with open(targetpath, "wb") as target:
+            while remaining > 0:
+                try:
+                    sent = os.sendfile(target.fileno(), self.fileobj.fileno(), offset, remaining)
+                except OSError:
+                    if offset != tarinfo.offset_data:
+                        raise
+                    # Filesystem doesn't support sendfile(); copy normally
+                    break
+                if not sent:
+                    raise tarfile.ReadError("unexpected end of data")
+                offset += sent
+                remaining -= sent
+            else:
+                return
+        super().makefile(tarinfo, targetpath)
 
-def extract_tar(filename):
-    """Extract regular tar file."""
+def is_secure_tar_member(member):
+    """Return True for a regular top-level *.tar.gz member of the backup."""
+    name = os.path.normpath(member.name)
+    return (
+        member.isfile()
+        and name.endswith('.tar.gz')
+        and not os.path.isabs(name)
+        and os.path.dirname(name) in ('', '.')
+    )
+
+def extract_tar(filename, password):
+    """Extract backup tar file, decrypting encrypted members as they are read.
+
+    Returns the number of members decrypted, or None if there were none.
+    """
     _dirname = '.'.join(filename.split('.')[:-1])
-    try:
-        shutil.rmtree(_dirname)
-    except FileNotFoundError:
-        pass
+    remove_tree_in_background(_dirname)
     print(f'📦 Extracting {filename}...')
-    _tar = tarfile.open(name=filename, mode="r")
-    _tar.extractall(path=_dirname)
-    return _dirname
+    success_count = None
+    # Backups are uncompressed; "r:" refuses anything else rather than
+    # letting the sendfile() copy read compressed bytes.
+    with _SendfileTarFile.open(name=filename, mode="r:", copybufsize=1 << 20) as _tar:
+        fadvise(_tar.fileobj, "POSIX_FADV_SEQUENTIAL")
+        # Iterate lazily so members are handled as their headers are read
+        for member in _tar:
+            if is_secure_tar_member(member):
+                success_count = success_count or 0
+                secure_tar = os.path.join(_dirname, os.path.normpath(member.name))
+                with _tar.extractfile(member) as fileobj:
+                    if extract_secure_tar(secure_tar, password, fileobj):
+                        success_count += 1
+                        continue
+            # Keep the encrypted file if it could not be decrypted
+            _tar.extract(member, path=_dirname)
+        # The backup is not read again, so drop it from the page cache
+        fadvise(_tar.fileobj, "POSIX_FADV_DONTNEED")
+    return success_count
 
-def extract_secure_tar(filename, password):
-    """Extract encrypted tar file."""
+def extract_secure_tar(filename, password, fileobj=None):
+    """Extract encrypted tar file, reading from fileobj if given."""
     _dirname = '.'.join(filename.split('.')[:-2])
-    print(f'🔓 Decrypting {filename.split("/")[-1]}...')
+    print(f'🔓 Decrypting {filename}...')
     try:
-        with SecureTarFile(filename, password) as _tar:
+        with SecureTarFile(filename, password, fileobj) as _tar:
             _tar.extractall(path=_dirname)
     except tarfile.ReadError:
-        print("❌ Error: Unable to extract SecureTar - possible wrong password or file is not encrypted")
+        print(f"❌ Error: Unable to extract SecureTar {filename} - possible wrong password or file is not encrypted")
         return None
     except Exception as e:
-        print(f"❌ Error during extraction: {str(e)}")
+        print(f"❌ Error during extraction of {filename}: {str(e)}")
         return None
     return _dirname
 
+def process_tar(tar_file, key):
+    """Extract one backup and decrypt its contents. Return the number decrypted."""
+    success_count = 0
+    try:
+        success_count = extract_tar(tar_file, key)
+        if success_count is None:
+            print(f"ℹ️  No encrypted files found in {tar_file}")
+            success_count = 0
+    except Exception as e:
+        print(f"❌ Error processing {tar_file}: {str(e)}")
+    # Not in a finally: Ctrl-C should exit without waiting on the deletion
+    wait_for_cleanup()
+    return success_count
+
 def main():
     print("\n🏠 Home Assistant Backup Decryption Tool")
     print("=======================================")
@@ -148,8 +451,11 @@ def main():
     # Check requirements first
     check_requirements()
     
-    # Look for emergency kit file
-    kit_files = glob.glob('*emergency*kit*.txt')
+    # Classify the directory's files in a single pass
+    with os.scandir('.') as it:
+        names = [e.name for e in it if e.is_file() and not e.name.startswith('.')]
+    kit_files = [n for n in names if is_kit_file(n)]
+    tar_files = [n for n in names if n.endswith('.tar')]
     
     # Try to extract key from the kit file first
     key = None
@@ -168,15 +474,13 @@ def main():
         print("It should be in the format: XXXX-XXXX-XXXX-XXXX-XXXX-XXXX-XXXX")
         while True:
             manual_key = input("Key: ").strip()
-            if re.match(r'^([A-Z0-9]{4}-){6}[A-Z0-9]{4}$', manual_key):
+            if is_valid_key(manual_key):
                 key = manual_key
                 print("✅ Key format verified")
                 break
             else:
                 print("❌ Invalid key format. Please try again.")
     
-    # Look for tar files
-    tar_files = glob.glob('*.tar')
     if not tar_files:
         print("❌ Error: No .tar files found!")
         print("Please place your backup .tar files in this directory.")
@@ -184,22 +488,13 @@ def main():
     
     print(f"📁 Found {len(tar_files)} backup file(s) to process")
     
-    success_count = 0
-    for tar_file in tar_files:
-        try:
-            _dirname = extract_tar(tar_file)
-            # Look for encrypted tar.gz files in the extracted directory
-            secure_tars = glob.glob(f'{_dirname}/*.tar.gz')
-            if not secure_tars:
-                print(f"ℹ️  No encrypted files found in {tar_file}")
-                continue
-                
-            for secure_tar in secure_tars:
-                if extract_secure_tar(secure_tar, key):
-                    os.remove(secure_tar)  # Remove the encrypted file after successful extraction
-                    success_count += 1
-        except Exception as e:
-            print(f"❌ Error processing {tar_file}: {str(e)}")
+    # Backups are independent, so process them in parallel
+    if len(tar_files) > 1:
+        workers = min(len(tar_files), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            success_count = sum(executor.map(partial(process_tar, key=key), tar_files))
+    else:
+        success_count = process_tar(tar_files[0], key)
     
     if success_count > 0:
         print(f"\n✅ Successfully decrypted {success_count} backup file(s)!")